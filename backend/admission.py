@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+from collections import deque
+
+from triage_engine import engine as triage_rules
+
+
+CLINICAL_CONCURRENCY = 8
+READ_CONCURRENCY = 16
+MAX_READ_QUEUE = 64
+
+# Latency SLOs (p95 over the last LATENCY_WINDOW_SECONDS); once breached, reads are shed instead of queued.
+# Clinical latency is the wait for a slot: handler time includes the external LLM justification.
+CLINICAL_SLO_MS = 500
+READ_SLO_MS = 1500
+LATENCY_WINDOW_SECONDS = 60
+LATENCY_WINDOW_MAX_SAMPLES = 5000
+RETRY_AFTER_SECONDS = 2
+
+CLINICAL_ROUTES = [
+    ("POST", "/api/triage/assess"),
+    ("POST", "/api/erp/admit"),
+    ("POST", "/api/erp/discharge/"),
+    ("POST", "/api/ambulance/dispatch"),
+    ("POST", "/api/ambulance/reset/"),
+]
+EXEMPT_PATHS = {"/api/metrics/admission"}
+
+# Queue priority for clinical writes: triage uses its preliminary ESI level (1-5)
+OTHER_CLINICAL_PRIORITY = 3
+
+
+class PriorityLimiter:
+    """Concurrency budget whose waiters are released lowest priority value first, FIFO within a level."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = []
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, priority: int):
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Slot was handed over just as the client went away
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(None) # slot passes straight to the waiter
+                return
+        self.active -= 1
+
+
+class LatencyWindow:
+    """Samples from the last `seconds` only, so a past surge stops counting once traffic goes quiet."""
+
+    def __init__(self, seconds: float = LATENCY_WINDOW_SECONDS, max_samples: int = LATENCY_WINDOW_MAX_SAMPLES):
+        self.seconds = seconds
+        self.samples = deque(maxlen=max_samples) # (monotonic time, ms)
+
+    def add(self, ms: float):
+        self.samples.append((time.monotonic(), ms))
+
+    def p95(self) -> float:
+        cutoff = time.monotonic() - self.seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        if not self.samples:
+            return 0.0
+        ordered = sorted(ms for _, ms in self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class AdmissionStats:
+    def __init__(self):
+        self.admitted = {"critical": 0, "clinical": 0, "read": 0}
+        self.shed = {}
+        self.shed_total = 0
+        self.latency = {"clinical": LatencyWindow(), "read": LatencyWindow()}
+
+    def record_shed(self, path: str):
+        # Keyed by route prefix so ids in the path don't grow the table
+        key = "/".join(path.split("/")[:4])
+        self.shed_total += 1
+        self.shed[key] = self.shed.get(key, 0) + 1
+
+
+def classify(method: str, path: str):
+    for route_method, prefix in CLINICAL_ROUTES:
+        if method == route_method and (path == prefix or (prefix.endswith("/") and path.startswith(prefix))):
+            return "clinical"
+    return "read"
+
+
+def preliminary_acuity(body: bytes) -> int:
+    try:
+        payload = json.loads(body or b"{}")
+        level, _ = triage_rules.score(payload.get("symptoms") or [], payload.get("vitals") or {})
+        return level
+    except Exception:
+        # Unparseable bodies still get a slot; validation rejects them downstream
+        return OTHER_CLINICAL_PRIORITY
+
+
+class AdmissionControlMiddleware:
+    """
+    Separate concurrency budgets for clinical writes and for reads/telemetry.
+    Clinical work queues by acuity and is never rejected; reads are shed with
+    503 + Retry-After once the read budget is saturated and an SLO is breached.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.clinical = PriorityLimiter(CLINICAL_CONCURRENCY)
+        self.reads = PriorityLimiter(READ_CONCURRENCY)
+        self.stats = AdmissionStats()
+        set_controller(self)
+
+    def slo_breached(self) -> bool:
+        return (self.stats.latency["clinical"].p95() > CLINICAL_SLO_MS
+                or self.stats.latency["read"].p95() > READ_SLO_MS)
+
+    def snapshot(self) -> dict:
+        return {
+            "clinical": {"in_flight": self.clinical.active, "queued": self.clinical.queued, "limit": self.clinical.limit,
+                         "p95_wait_ms": round(self.stats.latency["clinical"].p95(), 1)},
+            "read": {"in_flight": self.reads.active, "queued": self.reads.queued, "limit": self.reads.limit,
+                     "p95_ms": round(self.stats.latency["read"].p95(), 1)},
+            "slo_breached": self.slo_breached(),
+            "admitted": self.stats.admitted,
+            "shed_total": self.stats.shed_total,
+            "shed_by_path": self.stats.shed,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        kind = classify(scope["method"], scope["path"])
+        if kind == "clinical":
+            await self._run_clinical(scope, receive, send)
+        else:
+            await self._run_read(scope, receive, send)
+
+    async def _run_clinical(self, scope, receive, send):
+        priority = OTHER_CLINICAL_PRIORITY
+        if scope["path"] == "/api/triage/assess":
+            # Body is read up front to rank the request, then replayed to the endpoint
+            body = b""
+            more = True
+            while more:
+                message = await receive()
+                body += message.get("body", b"")
+                more = message.get("more_body", False)
+            priority = preliminary_acuity(body)
+            receive = _replay(body, receive)
+
+        queued_at = time.perf_counter()
+        await self.clinical.acquire(priority)
+        self.stats.latency["clinical"].add((time.perf_counter() - queued_at) * 1000)
+        label = "critical" if priority <= 2 else "clinical"
+        self.stats.admitted[label] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.clinical.release()
+
+    async def _run_read(self, scope, receive, send):
+        saturated = self.reads.active >= self.reads.limit
+        if saturated and (self.reads.queued >= MAX_READ_QUEUE or self.slo_breached()):
+            self.stats.record_shed(scope["path"])
+            await _service_unavailable(send)
+            return
+
+        await self.reads.acquire(0)
+        self.stats.admitted["read"] += 1
+        try:
+            await self._timed(self.stats.latency["read"], scope, receive, send)
+        finally:
+            self.reads.release()
+
+    async def _timed(self, window: LatencyWindow, scope, receive, send):
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            window.add((time.perf_counter() - start) * 1000)
+
+
+def _replay(body: bytes, receive):
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
+
+
+async def _service_unavailable(send):
+    body = json.dumps({"detail": "Server busy, retry shortly."}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(RETRY_AFTER_SECONDS).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+_controller = None
+
+
+def set_controller(controller: AdmissionControlMiddleware):
+    global _controller
+    _controller = controller
+
+
+def current_snapshot() -> dict:
+    return _controller.snapshot() if _controller else {}
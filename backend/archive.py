@@ -0,0 +1,162 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from sqlalchemy.orm import Session
+
+import models
+
+
+ARCHIVE_DIR = "./archive"
+RETENTION_DAYS = 30
+COMPRESSION = "zstd"
+DELETE_BATCH = 500 # stays under SQLite's bound-parameter limit
+
+PATIENT_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("esi_level", pa.int64()),
+    ("acuity", pa.string()),
+    ("symptoms", pa.list_(pa.string())),
+    ("timestamp", pa.timestamp("us")),
+    ("patient_name", pa.string()),
+    ("patient_age", pa.int64()),
+    ("condition", pa.string()),
+    ("discharge_time", pa.timestamp("us")),
+])
+
+EVENT_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("patient_id", pa.string()),
+    ("event_type", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+    ("details", pa.string()),
+])
+
+TABLES = {
+    "patients": (models.PatientRecord, PATIENT_SCHEMA),
+    "events": (models.Event, EVENT_SCHEMA),
+}
+
+
+def day_path(table: str, day: date) -> str:
+    return os.path.join(ARCHIVE_DIR, table, f"{day.isoformat()}.arrow")
+
+
+def archived_days(table: str) -> List[date]:
+    folder = os.path.join(ARCHIVE_DIR, table)
+    if not os.path.isdir(folder):
+        return []
+    days = []
+    for name in os.listdir(folder):
+        if name.endswith(".arrow"):
+            days.append(date.fromisoformat(name[:-len(".arrow")]))
+    return sorted(days)
+
+
+def read_day(table: str, day: date, columns: Optional[List[str]] = None) -> pa.Table:
+    path = day_path(table, day)
+    schema = TABLES[table][1]
+    if not os.path.exists(path):
+        fields = columns or schema.names
+        return pa.schema([schema.field(c) for c in fields]).empty_table()
+    # Only the requested columns are decoded; the rest of the file is never paged in
+    return feather.read_table(path, columns=columns, memory_map=True)
+
+
+def read_day_rows(table: str, day: date, columns: Optional[List[str]] = None) -> List[dict]:
+    return read_day(table, day, columns).to_pylist()
+
+
+def read_events(start_day: date, end_day: date, event_types: Optional[List[str]] = None,
+                columns: Optional[List[str]] = None) -> List[dict]:
+    rows = []
+    for day in archived_days("events"):
+        if day < start_day or day > end_day:
+            continue
+        needed = columns
+        if event_types and columns and "event_type" not in columns:
+            needed = columns + ["event_type"]
+        tbl = read_day("events", day, needed)
+        if event_types:
+            tbl = tbl.filter(pc.is_in(tbl["event_type"], value_set=pa.array(event_types)))
+        if columns:
+            tbl = tbl.select(columns)
+        rows.extend(tbl.to_pylist())
+    return rows
+
+
+def _write_day(table: str, day: date, rows: List[dict]):
+    schema = TABLES[table][1]
+    new_tbl = pa.Table.from_pylist(rows, schema=schema)
+
+    path = day_path(table, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        # A day can be archived in several passes (patients discharged after the first run);
+        # rows left over from an interrupted run are replaced rather than duplicated
+        existing = feather.read_table(path)
+        existing = existing.filter(pc.invert(pc.is_in(existing["id"], value_set=new_tbl["id"].combine_chunks())))
+        new_tbl = pa.concat_tables([existing, new_tbl])
+
+    tmp_path = path + ".tmp"
+    feather.write_feather(new_tbl, tmp_path, compression=COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def to_row(obj, schema: pa.Schema) -> dict:
+    return {name: getattr(obj, name) for name in schema.names}
+
+
+def _archive_table(db: Session, table: str, query) -> int:
+    model, schema = TABLES[table]
+    by_day = {}
+    for obj in query.all():
+        by_day.setdefault(obj.timestamp.date(), []).append(obj)
+
+    for day, objs in sorted(by_day.items()):
+        _write_day(table, day, [to_row(o, schema) for o in objs])
+        # Hot rows are only removed once their day file is safely on disk
+        ids = [o.id for o in objs]
+        for i in range(0, len(ids), DELETE_BATCH):
+            db.query(model).filter(model.id.in_(ids[i:i + DELETE_BATCH])).delete(synchronize_session=False)
+        db.commit()
+
+    return sum(len(objs) for objs in by_day.values())
+
+
+@contextmanager
+def _archival_lock():
+    # One archival pass at a time across threads and workers; they share the day files
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with open(os.path.join(ARCHIVE_DIR, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def run_archival(db: Session, retention_days: int = RETENTION_DAYS) -> dict:
+    with _archival_lock():
+        return _run_archival(db, retention_days)
+
+
+def _run_archival(db: Session, retention_days: int) -> dict:
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=retention_days), datetime.min.time())
+
+    closed_patients = db.query(models.PatientRecord).filter(
+        models.PatientRecord.discharge_time != None,
+        models.PatientRecord.timestamp < cutoff
+    )
+    old_events = db.query(models.Event).filter(models.Event.timestamp < cutoff)
+
+    return {
+        "cutoff": cutoff.isoformat(),
+        "patients_archived": _archive_table(db, "patients", closed_patients),
+        "events_archived": _archive_table(db, "events", old_events),
+    }
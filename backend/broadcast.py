@@ -0,0 +1,160 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+
+BACKEND = os.getenv("PHRELIS_BROADCAST_BACKEND", "local") # local, unix
+SOCKET_PATH = os.getenv("PHRELIS_BROADCAST_SOCKET", "/tmp/phrelis_bus.sock")
+RECONNECT_SECONDS = 0.5
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[dict], Awaitable[None]]
+
+
+class LocalBus:
+    """Single-process pub/sub: publish hands the message straight to this worker's subscribers."""
+
+    is_leader = True
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    async def publish(self, message: dict):
+        if self._deliver:
+            await self._deliver(message)
+
+
+class UnixSocketBus:
+    """
+    Cross-process pub/sub over a Unix-domain socket, no external service needed.
+    The worker holding the hub lock serves the socket; the others connect to it.
+    Every message goes through the hub, which stamps a sequence number and fans it
+    out to all workers (itself included), so every client sees the same order.
+    """
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self.is_leader = False
+        self._deliver: Optional[Deliver] = None
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        self._server = None
+        self._peers = set() # hub side: writers of connected workers
+        self._writer = None # worker side: connection to the hub
+        self._seq = 0
+        self._tasks = []
+        self._lock_fd = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        # Elect eagerly so leader-only jobs scheduled at startup see the outcome
+        if not await self._try_become_hub():
+            self._tasks.append(asyncio.create_task(self._maintain()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._server:
+            self._server.close()
+            for writer in list(self._peers):
+                writer.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+        if self._writer:
+            self._writer.close()
+
+    async def publish(self, message: dict):
+        if self.is_leader:
+            self._fan_out(message)
+        elif self._writer:
+            self._writer.write(json.dumps(message).encode() + b"\n")
+            await self._writer.drain()
+        else:
+            # Hub unreachable: still reach this worker's own clients
+            await self._inbox.put(message)
+
+    # --- hub side ---
+
+    def _fan_out(self, message: dict):
+        self._seq += 1
+        message = {**message, "seq": self._seq}
+        line = json.dumps(message).encode() + b"\n"
+        for writer in list(self._peers):
+            try:
+                writer.write(line)
+            except Exception:
+                self._peers.discard(writer)
+        self._inbox.put_nowait(message)
+
+    async def _serve_peer(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._fan_out(json.loads(line))
+        except (ConnectionError, json.JSONDecodeError, asyncio.CancelledError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    async def _try_become_hub(self) -> bool:
+        # Leadership is an exclusive lock, released by the OS if the hub process dies
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        # start_unix_server replaces a stale socket file left by a dead hub
+        self._server = await asyncio.start_unix_server(self._serve_peer, path=self.path)
+        self.is_leader = True
+        return True
+
+    # --- worker side ---
+
+    async def _maintain(self):
+        while True:
+            if await self._try_become_hub():
+                return
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await self._inbox.put(json.loads(line))
+            except (ConnectionError, FileNotFoundError, json.JSONDecodeError):
+                pass
+            self._writer = None
+            # Hub went away: race the other workers to take over
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _dispatch(self):
+        while True:
+            message = await self._inbox.get()
+            try:
+                await self._deliver(message)
+            except Exception:
+                logger.exception("Broadcast delivery failed")
+
+
+def create_bus(backend: str = BACKEND):
+    if backend == "unix":
+        return UnixSocketBus()
+    return LocalBus()
@@ -0,0 +1,244 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import List
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+import rollups
+
+
+UNITS = ["ICU", "ER"]
+VENTILATOR_CAPACITY = 20
+
+STEP_HOURS = 0.25
+DEFAULT_REPLICATIONS = 4000
+MIN_CHUNK = 500 # below this a pool round-trip costs more than it saves
+POOL_WORKERS = os.cpu_count() or 1
+CACHE_TTL_SECONDS = 300
+
+# Used until the rollups / history have enough data
+DEFAULT_LOS_HOURS = {"ICU": 48.0, "ER": 4.0}
+DEFAULT_ICU_SHARE = 0.2
+DEFAULT_VENT_SHARE = 0.15
+LOS_SIGMA = 0.8 # lognormal shape
+REJECTION_ROUNDS = 8
+
+
+def snapshot_state(db: Session) -> dict:
+    """Live occupancy plus the mix/LOS parameters the simulation samples from."""
+    now = datetime.utcnow()
+    units = {}
+    for unit in UNITS:
+        beds = db.query(models.BedModel).filter(models.BedModel.type == unit).all()
+        occupied = [b for b in beds if b.is_occupied]
+        units[unit] = {
+            "capacity": len(beds),
+            "elapsed_hours": [max(0.0, (now - b.admission_time).total_seconds() / 3600) if b.admission_time else 0.0
+                              for b in occupied],
+        }
+        p50 = rollups.los_summary(db, 90, unit)["p50_minutes"]
+        units[unit]["los_median_hours"] = p50 / 60 if p50 else DEFAULT_LOS_HOURS[unit]
+
+    vent_beds = db.query(models.BedModel).filter(models.BedModel.ventilator_in_use == True).all()
+    vent_elapsed = [max(0.0, (now - b.admission_time).total_seconds() / 3600) if b.admission_time else 0.0
+                    for b in vent_beds]
+
+    # ESI mix from the last 30 days of triage
+    since = now - timedelta(days=30)
+    recent = db.query(models.PatientRecord.esi_level, models.PatientRecord.acuity).filter(
+        models.PatientRecord.timestamp >= since
+    ).all()
+    critical = [r for r in recent if (r.esi_level or 3) <= 2]
+    icu_share = len(critical) / len(recent) if len(recent) >= 20 else DEFAULT_ICU_SHARE
+    vented = [r for r in critical if "Ventilator" in (r.acuity or "")]
+    vent_share = len(vented) / len(critical) if len(critical) >= 10 else DEFAULT_VENT_SHARE
+
+    return {
+        "units": units,
+        "ventilators": {"capacity": VENTILATOR_CAPACITY, "elapsed_hours": vent_elapsed},
+        "icu_share": icu_share,
+        "vent_share": vent_share,
+    }
+
+
+def _residual_los(rng, elapsed: np.ndarray, median_hours: float, replications: int) -> np.ndarray:
+    # LOS conditioned on having already stayed `elapsed` hours, by redrawing the short samples
+    mu = math.log(median_hours)
+    full = np.broadcast_to(elapsed, (replications, len(elapsed)))
+    los = rng.lognormal(mu, LOS_SIGMA, size=full.shape)
+    for _ in range(REJECTION_ROUNDS):
+        short = los <= full
+        if not short.any():
+            break
+        los[short] = rng.lognormal(mu, LOS_SIGMA, size=int(short.sum()))
+    # Stays far beyond the usual distribution fall back to a memoryless tail
+    short = los <= full
+    los[short] = full[short] + rng.exponential(median_hours * 0.5, size=int(short.sum()))
+    return los - full
+
+
+def _exhaustion_hours(rng, arrivals: np.ndarray, elapsed: List[float], capacity: int, median_hours: float) -> np.ndarray:
+    """Hours until occupancy first reaches capacity, per replication (inf if it never does)."""
+    reps, steps = arrivals.shape
+    occupied = len(elapsed)
+    if capacity <= 0 or occupied >= capacity:
+        return np.zeros(reps)
+
+    change = arrivals.astype(np.int64)
+
+    if occupied:
+        residual = _residual_los(rng, np.asarray(elapsed, dtype=float), median_hours, reps)
+        dep_step = np.ceil(residual / STEP_HOURS).astype(np.int64) - 1
+        rows = np.broadcast_to(np.arange(reps)[:, None], dep_step.shape)
+        inside = dep_step < steps
+        np.add.at(change, (rows[inside], dep_step[inside]), -1)
+
+    total = int(arrivals.sum())
+    if total:
+        cell = np.repeat(np.arange(reps * steps), arrivals.ravel())
+        row, arrival_step = cell // steps, cell % steps
+        los = rng.lognormal(math.log(median_hours), LOS_SIGMA, size=total)
+        dep_step = arrival_step + np.ceil(los / STEP_HOURS).astype(np.int64)
+        inside = dep_step < steps
+        np.add.at(change, (row[inside], dep_step[inside]), -1)
+
+    occupancy = occupied + np.cumsum(change, axis=1)
+    full = occupancy >= capacity
+    first = full.argmax(axis=1)
+    return np.where(full.any(axis=1), (first + 1) * STEP_HOURS, np.inf)
+
+
+def simulate_chunk(state: dict, hourly_arrivals: List[float], replications: int, seed) -> dict:
+    rng = np.random.default_rng(seed)
+    per_hour = int(round(1 / STEP_HOURS))
+    rate = np.repeat(np.asarray(hourly_arrivals, dtype=float), per_hour) * STEP_HOURS
+    arrivals = rng.poisson(rate, size=(replications, len(rate)))
+
+    icu = rng.binomial(arrivals, state["icu_share"])
+    by_unit = {"ICU": icu, "ER": arrivals - icu}
+    vent = rng.binomial(icu, state["vent_share"])
+
+    result = {}
+    for unit in UNITS:
+        spec = state["units"][unit]
+        result[unit] = _exhaustion_hours(rng, by_unit[unit], spec["elapsed_hours"], spec["capacity"], spec["los_median_hours"])
+    vents = state["ventilators"]
+    result["Ventilators"] = _exhaustion_hours(rng, vent, vents["elapsed_hours"], vents["capacity"],
+                                              state["units"]["ICU"]["los_median_hours"])
+    return result
+
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a process that already runs an event loop and DB threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool(wait: bool = True):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+
+
+def _ready() -> bool:
+    return True
+
+
+async def warm_pool():
+    # Spawning workers takes seconds; pay for it at startup instead of on the first dispatch
+    if POOL_WORKERS < 2:
+        return # single-chunk projections run in a thread, never in the pool
+    pool = _get_pool()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*[loop.run_in_executor(pool, _ready) for _ in range(POOL_WORKERS)])
+
+
+class Projection:
+    def __init__(self, exhaustion: dict, horizon_hours: float, replications: int):
+        self.exhaustion = exhaustion
+        self.horizon_hours = horizon_hours
+        self.replications = replications
+        self.computed_at = time.time()
+
+    def probability_within(self, unit: str, hours: float) -> float:
+        times = self.exhaustion.get(unit)
+        if times is None or not len(times):
+            return 0.0
+        return float(np.mean(times <= hours))
+
+    def summary(self) -> dict:
+        out = {}
+        for unit, times in self.exhaustion.items():
+            p10, p50, p90 = np.percentile(times, [10, 50, 90], method="inverted_cdf")
+            out[unit] = {
+                "prob_exhausted": round(float(np.mean(np.isfinite(times))), 3),
+                # Percentiles past the horizon are reported as None ("not within horizon")
+                "p10_hours": round(float(p10), 2) if np.isfinite(p10) else None,
+                "p50_hours": round(float(p50), 2) if np.isfinite(p50) else None,
+                "p90_hours": round(float(p90), 2) if np.isfinite(p90) else None,
+            }
+        return {
+            "horizon_hours": self.horizon_hours,
+            "replications": self.replications,
+            "computed_at": datetime.utcfromtimestamp(self.computed_at).isoformat(),
+            "units": out,
+        }
+
+
+_cache = {"key": None, "projection": None}
+
+
+def _fingerprint(state: dict, hourly_arrivals: List[float], replications: int) -> tuple:
+    return (
+        tuple((u, s["capacity"], len(s["elapsed_hours"])) for u, s in sorted(state["units"].items())),
+        len(state["ventilators"]["elapsed_hours"]),
+        round(state["icu_share"], 3),
+        round(state["vent_share"], 3),
+        tuple(round(a, 2) for a in hourly_arrivals),
+        replications,
+    )
+
+
+async def project(state: dict, hourly_arrivals: List[float], replications: int = DEFAULT_REPLICATIONS) -> Projection:
+    key = _fingerprint(state, hourly_arrivals, replications)
+    cached = _cache["projection"]
+    if _cache["key"] == key and cached and time.time() - cached.computed_at < CACHE_TTL_SECONDS:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    chunks = max(1, min(POOL_WORKERS, replications // MIN_CHUNK))
+    sizes = [replications // chunks + (1 if i < replications % chunks else 0) for i in range(chunks)]
+    seeds = np.random.SeedSequence().spawn(chunks)
+
+    if chunks == 1:
+        parts = [await loop.run_in_executor(None, simulate_chunk, state, hourly_arrivals, sizes[0], seeds[0])]
+    else:
+        pool = _get_pool()
+        try:
+            parts = await asyncio.gather(*[
+                loop.run_in_executor(pool, simulate_chunk, state, hourly_arrivals, n, seed)
+                for n, seed in zip(sizes, seeds)
+            ])
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); drop the pool so the next projection starts a fresh one
+            shutdown_pool(wait=False)
+            raise
+
+    exhaustion = {unit: np.concatenate([p[unit] for p in parts]) for unit in parts[0]}
+    projection = Projection(exhaustion, len(hourly_arrivals), replications)
+    _cache["key"], _cache["projection"] = key, projection
+    return projection
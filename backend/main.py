@@ -1,29 +1,49 @@
 import uvicorn
+import asyncio
+import logging
 import math
+import os
+import time
 import uuid
 from datetime import datetime
 from typing import List, Optional
-from datetime import datetime, date
-from sqlalchemy import func
+from datetime import datetime, date, timedelta
+from sqlalchemy import func, text
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Depends, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 
 
-from database import engine, get_db
+from database import engine, get_db, SessionLocal, seed_lock
 import models
+import admission
+import archive
+import broadcast
+import capacity_sim
+import rollups
+import search
+import telemetry
+from triage_engine import engine as triage_rules, seed_default_rules, normalize_symptom, VITALS
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
 
 
-models.Base.metadata.create_all(bind=engine)
+with seed_lock():
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_index(engine)
+search.register_listeners()
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="PHRELIS Hospital OS")
 
+# Registered before CORS so shed responses still carry CORS headers
+app.add_middleware(admission.AdmissionControlMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -58,18 +78,41 @@ ai_agent = MedicalAgent()
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        # Pub/sub backend so a broadcast from any worker reaches every worker's sockets
+        self.bus = broadcast.create_bus()
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+        await self.bus.publish(message)
+    async def deliver(self, message: dict):
+        if message.get("type") == "TRIAGE_RULES_CHANGED":
+            # Internal: keep every worker's compiled rules in step
+            await run_in_threadpool(reload_triage_rules_once)
+            return
+        for connection in list(self.active_connections):
             try: await connection.send_json(message)
             except: pass
 
+def reload_triage_rules_once():
+    db = SessionLocal()
+    try:
+        triage_rules.reload(db)
+    finally:
+        db.close()
+
 manager = ConnectionManager()
 
+@app.on_event("startup")
+async def start_broadcast_bus():
+    await manager.bus.start(manager.deliver)
+
+@app.on_event("shutdown")
+async def stop_broadcast_bus():
+    await manager.bus.stop()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -91,6 +134,21 @@ class TriageRequest(BaseModel):
     symptoms: List[str]
     vitals: Optional[dict] = {}
 
+class TriageBatchRequest(BaseModel):
+    patients: List[TriageRequest]
+
+class TriageRuleCreate(BaseModel):
+    symptom: str
+    esi_level: int = Field(ge=1, le=5)
+    is_active: bool = True
+
+class VitalsBandCreate(BaseModel):
+    vital: str
+    min_value: Optional[float] = None
+    max_value: Optional[float] = None
+    esi_level: Optional[int] = Field(default=None, ge=1, le=5)
+    requires_ventilator: bool = False
+
 class AmbulanceRequest(BaseModel):
     severity: str 
     location: str
@@ -136,6 +194,8 @@ async def admit_patient(request: AdmissionRequest, db: Session = Depends(get_db)
     bed.is_occupied = True
     bed.patient_name = request.patient_name
     bed.condition = request.condition
+    bed.admission_time = datetime.utcnow()
+    bed.ventilator_in_use = False
 
     
     if hasattr(bed, 'age'): 
@@ -153,6 +213,7 @@ async def admit_patient(request: AdmissionRequest, db: Session = Depends(get_db)
         condition=request.condition
     )
     db.add(new_record)
+    rollups.record_arrival(db, bed.type, new_record.timestamp)
 
     db.commit()
     db.refresh(bed)
@@ -182,11 +243,16 @@ async def discharge(bed_id: str, db: Session = Depends(get_db)):
             if history_record:
                 history_record.discharge_time = datetime.utcnow()
 
+        # Discharging an empty bed (retry, double-click) must not count as another stay
+        if bed.is_occupied:
+            rollups.record_discharge(db, bed.type, bed.admission_time, datetime.utcnow(), bool(bed.ventilator_in_use))
+
         bed.is_occupied = False
         bed.patient_name = None
         bed.patient_age = None
         bed.condition = None
         bed.ventilator_in_use = False
+        bed.admission_time = None
         db.commit()
         await manager.broadcast({"type": "REFRESH_RESOURCES"})
         return {"status": "success"}
@@ -194,26 +260,19 @@ async def discharge(bed_id: str, db: Session = Depends(get_db)):
 
 
 
+def acuity_for_level(level: int) -> str:
+    return "Resuscitation" if level == 1 else "Emergent" if level == 2 else "Urgent"
+
 @app.post("/api/triage/assess")
 async def assess_patient(request: TriageRequest, db: Session = Depends(get_db)):
 
-    level = 3 
-    if "chest pain" in request.symptoms or "stroke" in request.symptoms:
-        level = 1
-    elif "fever" in request.symptoms:
-        level = 4
+    level, ventilator_needed = triage_rules.score(request.symptoms, request.vitals)
     
-    acuity_text = "Resuscitation" if level == 1 else "Emergent" if level == 2 else "Urgent"
+    acuity_text = acuity_for_level(level)
     
     bed_type = "ICU" if level <= 2 else "ER"
     
-    # Ventilator Logic
-    spo2 = request.vitals.get("spo2", 100)
-    heart_rate = request.vitals.get("heart_rate", 80)
-    ventilator_needed = False
-    
-    if spo2 < 60 and heart_rate < 60:
-        ventilator_needed = True
+    if ventilator_needed:
         acuity_text += " (Ventilator Required)"
     
     # 1. Save to History Table (PatientRecord)
@@ -228,6 +287,7 @@ async def assess_patient(request: TriageRequest, db: Session = Depends(get_db)):
         condition=f"Triaged: {acuity_text}"
     )
     db.add(new_record)
+    rollups.record_arrival(db, bed_type, new_record.timestamp)
 
     # 2. Auto-assign Bed
     bed = db.query(models.BedModel).filter(
@@ -263,11 +323,97 @@ async def assess_patient(request: TriageRequest, db: Session = Depends(get_db)):
         "ai_justification": justification
     }
 
+@app.post("/api/triage/assess-batch")
+def assess_batch(request: TriageBatchRequest):
+    # Scoring only: no beds are assigned and nothing is written
+    levels, ventilators = triage_rules.score_batch(
+        [p.symptoms for p in request.patients],
+        [p.vitals for p in request.patients]
+    )
+    results = []
+    for level, vent in zip(levels.tolist(), ventilators.tolist()):
+        results.append({
+            "esi_level": level,
+            "severity": acuity_for_level(level) + (" (Ventilator Required)" if vent else ""),
+            "ventilator_needed": vent,
+            "bed_type": "ICU" if level <= 2 else "ER"
+        })
+    return {"results": results}
+
+@app.get("/api/triage/rules")
+def list_triage_rules(db: Session = Depends(get_db)):
+    return {
+        "symptom_rules": db.query(models.TriageRule).order_by(models.TriageRule.symptom).all(),
+        "vitals_bands": db.query(models.VitalsBand).all()
+    }
+
+@app.post("/api/triage/rules")
+async def upsert_triage_rule(rule: TriageRuleCreate, db: Session = Depends(get_db)):
+    # Stored under the same key the compiler matches on, so "Chest Pain" updates "chest pain"
+    symptom = normalize_symptom(rule.symptom)
+    if not symptom:
+        raise HTTPException(status_code=400, detail="symptom must not be empty")
+    existing = db.query(models.TriageRule).filter(models.TriageRule.symptom == symptom).first()
+    if existing:
+        existing.esi_level = rule.esi_level
+        existing.is_active = rule.is_active
+    else:
+        db.add(models.TriageRule(symptom=symptom, esi_level=rule.esi_level, is_active=rule.is_active))
+    db.commit()
+    loaded = triage_rules.reload(db)
+    await manager.broadcast({"type": "TRIAGE_RULES_CHANGED"})
+    return {"status": "success", "loaded": loaded}
+
+@app.post("/api/triage/bands")
+async def create_vitals_band(band: VitalsBandCreate, db: Session = Depends(get_db)):
+    if band.vital not in VITALS:
+        raise HTTPException(status_code=400, detail=f"vital must be one of {', '.join(VITALS)}")
+    if band.min_value is not None and band.max_value is not None and band.min_value >= band.max_value:
+        raise HTTPException(status_code=400, detail="min_value must be below max_value")
+    db.add(models.VitalsBand(**band.dict(), is_active=True))
+    db.commit()
+    loaded = triage_rules.reload(db)
+    await manager.broadcast({"type": "TRIAGE_RULES_CHANGED"})
+    return {"status": "success", "loaded": loaded}
+
+@app.delete("/api/triage/bands/{band_id}")
+async def delete_vitals_band(band_id: int, db: Session = Depends(get_db)):
+    band = db.query(models.VitalsBand).filter(models.VitalsBand.id == band_id).first()
+    if not band:
+        raise HTTPException(status_code=404, detail="Vitals band not found")
+    db.delete(band)
+    db.commit()
+    loaded = triage_rules.reload(db)
+    await manager.broadcast({"type": "TRIAGE_RULES_CHANGED"})
+    return {"status": "success", "loaded": loaded}
+
+@app.post("/api/triage/bands/{band_id}/active")
+async def set_vitals_band_active(band_id: int, enabled: bool = True, db: Session = Depends(get_db)):
+    band = db.query(models.VitalsBand).filter(models.VitalsBand.id == band_id).first()
+    if not band:
+        raise HTTPException(status_code=404, detail="Vitals band not found")
+    band.is_active = enabled
+    db.commit()
+    loaded = triage_rules.reload(db)
+    await manager.broadcast({"type": "TRIAGE_RULES_CHANGED"})
+    return {"status": "success", "loaded": loaded}
+
+@app.post("/api/triage/rules/reload")
+async def reload_triage_rules(db: Session = Depends(get_db)):
+    # Picks up edits made directly in the rule tables without a restart
+    loaded = triage_rules.reload(db)
+    await manager.broadcast({"type": "TRIAGE_RULES_CHANGED"})
+    return {"status": "success", "loaded": loaded}
+
 @app.get("/api/history/day/{target_date}")
 def get_history_by_day(target_date: date, db: Session = Depends(get_db)):
-    return db.query(models.PatientRecord).filter(
+    live = db.query(models.PatientRecord).filter(
         func.date(models.PatientRecord.timestamp) == target_date
-    ).order_by(models.PatientRecord.timestamp.desc()).all()
+    ).all()
+    # Discharged encounters past the retention window live in the day file
+    records = [archive.to_row(r, archive.PATIENT_SCHEMA) for r in live]
+    records.extend(archive.read_day_rows("patients", target_date))
+    return sorted(records, key=lambda r: r["timestamp"], reverse=True)
 
 @app.get("/api/erp/bed-info/{bed_id}")
 def get_bed_info(bed_id: str, db: Session = Depends(get_db)):
@@ -290,30 +436,25 @@ def get_bed_info(bed_id: str, db: Session = Depends(get_db)):
 
 # --- Infrastructure ---
 
-@app.get("/api/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db)):
-
-    def get_count(unit_type: str):
-        return db.query(models.BedModel).filter(
-            models.BedModel.type == unit_type, 
-            models.BedModel.is_occupied == True
-        ).count()
-
-    er_occ = get_count("ER")
-    icu_occ = get_count("ICU")
-    wards_occ = get_count("Wards")
-    surgery_occ = get_count("Surgery")
+def dashboard_stats_from(beds, ambulances, staff):
+    # Built from already-loaded rows so one scan per table can feed several views
+    occupancy = {"ER": 0, "ICU": 0, "Wards": 0, "Surgery": 0}
+    vents_in_use = 0
+    for bed in beds:
+        if bed.is_occupied and bed.type in occupancy:
+            occupancy[bed.type] += 1
+        if bed.ventilator_in_use:
+            vents_in_use += 1
     
-    total_beds = db.query(models.BedModel).count() or 190
+    total_beds = len(beds) or 190
 
     # Resource Usage
-    vents_in_use = db.query(models.BedModel).filter(models.BedModel.ventilator_in_use == True).count()
-    amb_total = db.query(models.Ambulance).count()
-    amb_avail = db.query(models.Ambulance).filter(models.Ambulance.status == "IDLE").count()
+    amb_total = len(ambulances)
+    amb_avail = sum(1 for a in ambulances if a.status == "IDLE")
 
     # Staff Ratio (Patients per Doctor)
-    total_doctors = db.query(models.Staff).filter(models.Staff.role == "Doctor", models.Staff.is_clocked_in == True).count()
-    total_patients = er_occ + icu_occ + wards_occ + surgery_occ
+    total_doctors = sum(1 for s in staff if s.role == "Doctor" and s.is_clocked_in)
+    total_patients = sum(occupancy.values())
     
     ratio_str = "N/A"
     if total_doctors > 0:
@@ -322,38 +463,42 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
 
     return {
         "staff_ratio": ratio_str,
-        "occupancy": {
-            "ER": er_occ, 
-            "ICU": icu_occ, 
-            "Wards": wards_occ, 
-            "Surgery": surgery_occ
-        },
+        "occupancy": occupancy,
         "bed_stats": {
             "total": total_beds,
-            "occupied": er_occ + icu_occ + wards_occ + surgery_occ,
-            "available": total_beds - (er_occ + icu_occ + wards_occ + surgery_occ)
+            "occupied": total_patients,
+            "available": total_beds - total_patients
         },
         "resources": {
-            "Ventilators": {"total": 20, "in_use": vents_in_use},
+            "Ventilators": {"total": capacity_sim.VENTILATOR_CAPACITY, "in_use": vents_in_use},
             "Ambulances": {"total": amb_total, "available": amb_avail}
         }
     }
+
+@app.get("/api/dashboard/stats")
+def get_dashboard_stats(db: Session = Depends(get_db)):
+    return dashboard_stats_from(
+        db.query(models.BedModel).all(),
+        db.query(models.Ambulance).all(),
+        db.query(models.Staff).all()
+    )
 # Ambulance System 
 
 @app.get("/api/ambulances")
 def list_ambulances(db: Session = Depends(get_db)):
     return db.query(models.Ambulance).all()
 
+# Divert when the target unit is this likely to be full by the time the ambulance arrives
+DIVERSION_PROBABILITY = 0.8
+
 @app.post("/api/ambulance/dispatch")
-def dispatch_ambulance(request: AmbulanceRequest, db: Session = Depends(get_db)):
+async def dispatch_ambulance(request: AmbulanceRequest, db: Session = Depends(get_db)):
     # 1. Check Hospital Capacity (Diversion Logic)
     required_type = "ICU" if request.severity.upper() == "HIGH" else "ER"
     
     total_beds = 20 if required_type == "ICU" else 60
-    occupied = db.query(models.BedModel).filter(
-        models.BedModel.type == required_type, 
-        models.BedModel.is_occupied == True
-    ).count()
+    # Sync DB work runs in the threadpool so the event loop stays free during a surge
+    occupied = await run_in_threadpool(unit_occupancy, db, required_type)
     
     if occupied >= total_beds:
         return {
@@ -362,6 +507,29 @@ def dispatch_ambulance(request: AmbulanceRequest, db: Session = Depends(get_db))
             "ambulance_id": None
         }
 
+    try:
+        projection = await capacity_projection(db)
+        p_full = projection.probability_within(required_type, request.eta / 60)
+    except Exception:
+        # The projection only refines diversion; dispatch on the occupancy check alone
+        logger.exception("Capacity projection failed during dispatch")
+        p_full = 0.0
+    if p_full >= DIVERSION_PROBABILITY:
+        return {
+            "status": "DIVERTED",
+            "message": f"Hospital {required_type} projected full before arrival ({round(p_full * 100)}% likely). Ambulance Redirected to neighboring facility.",
+            "ambulance_id": None
+        }
+
+    return await run_in_threadpool(assign_idle_ambulance, db, request, required_type)
+
+def unit_occupancy(db: Session, unit: str) -> int:
+    return db.query(models.BedModel).filter(
+        models.BedModel.type == unit, 
+        models.BedModel.is_occupied == True
+    ).count()
+
+def assign_idle_ambulance(db: Session, request: AmbulanceRequest, required_type: str) -> dict:
     # 2. Find Available Ambulance
     ambulance = db.query(models.Ambulance).filter(models.Ambulance.status == "IDLE").first()
     
@@ -398,14 +566,9 @@ def reset_ambulance(ambulance_id: str, db: Session = Depends(get_db)):
 
 # Staff & Task Management 
 
-@app.get("/api/staff")
-def get_staff(db: Session = Depends(get_db)):
-
-    total_nurses = db.query(models.Staff).filter(models.Staff.role == "Nurse", models.Staff.is_clocked_in == True).count()
-    total_doctors = db.query(models.Staff).filter(models.Staff.role == "Doctor", models.Staff.is_clocked_in == True).count()
-    
-    staff_list = db.query(models.Staff).all()
-    assignments = db.query(models.BedAssignment).filter(models.BedAssignment.is_active == True).all()
+def staff_view(staff_list, assignments):
+    total_nurses = sum(1 for s in staff_list if s.role == "Nurse" and s.is_clocked_in)
+    total_doctors = sum(1 for s in staff_list if s.role == "Doctor" and s.is_clocked_in)
     
     return {
         "stats": {"nurses_on_shift": total_nurses, "doctors_on_shift": total_doctors},
@@ -413,6 +576,13 @@ def get_staff(db: Session = Depends(get_db)):
         "assignments": assignments
     }
 
+@app.get("/api/staff")
+def get_staff(db: Session = Depends(get_db)):
+    return staff_view(
+        db.query(models.Staff).all(),
+        db.query(models.BedAssignment).filter(models.BedAssignment.is_active == True).all()
+    )
+
 @app.post("/api/staff/clock")
 def clock_staff(request: StaffClockIn, db: Session = Depends(get_db)):
     staff = db.query(models.Staff).filter(models.Staff.id == request.staff_id).first()
@@ -504,6 +674,12 @@ def initialize_hospital_beds(db: Session):
 @app.on_event("startup")
 def seed_db():
     db = next(get_db())
+    # Every worker runs this; the lock keeps the check-then-insert steps from racing
+    with seed_lock():
+        seed_tables(db)
+    triage_rules.reload(db)
+
+def seed_tables(db: Session):
     initialize_hospital_beds(db)
     
     # Seed Ambulances
@@ -526,6 +702,15 @@ def seed_db():
         db.add_all(staff)
         db.commit()
 
+    # Triage rules
+    seed_default_rules(db)
+
+    # Analytics rollups
+    rollups.backfill_from_history(db)
+
+    # Search index
+    search.rebuild_if_empty(db)
+
 
 class WeatherService:
     @staticmethod
@@ -542,6 +727,31 @@ class WeatherService:
             "multiplier": multiplier, "reason": reason
         }
 
+def forecast_hourly_inflow(db: Session, w_mult: float, hours: int = 12):
+    """Expected arrivals for each of the next `hours` hours, as (hour label, value) pairs."""
+    occupied_count = db.query(models.BedModel).filter(models.BedModel.is_occupied == True).count()
+    # Saturation factor based on real-time bed data
+    saturation_factor = 1 + (occupied_count / 60) * 0.25 
+
+    # Hour-of-day arrival baseline from the rollups; bimodal model until there is enough history
+    profile = rollups.hourly_arrival_profile(db)
+
+    current_hour = datetime.now().hour
+    hourly = []
+    for i in range(1, hours + 1):
+        h = (current_hour + i) % 24
+        
+        if profile:
+            # Rollups are bucketed in UTC
+            base_inflow = profile[(datetime.utcnow().hour + i) % 24]
+        else:
+            morning_peak = 18 * math.exp(-((h - 10)**2) / 6) 
+            evening_peak = 14 * math.exp(-((h - 20)**2) / 5)
+            base_inflow = 4 + morning_peak + evening_peak
+        
+        hourly.append((f"{h}:00", base_inflow * w_mult * saturation_factor))
+    return hourly, saturation_factor, profile is not None
+
 @app.post("/api/predict-inflow")
 async def predict_inflow(db: Session = Depends(get_db)):
     """
@@ -551,28 +761,10 @@ async def predict_inflow(db: Session = Depends(get_db)):
     weather = await WeatherService.get_weather_coefficient()
     w_mult = weather["multiplier"] 
     
-    occupied_count = db.query(models.BedModel).filter(models.BedModel.is_occupied == True).count()
-    # Saturation factor based on real-time bed data
-    saturation_factor = 1 + (occupied_count / 60) * 0.25 
-
-    current_hour = datetime.now().hour
-    forecast = []
-    total_val = 0
-    
     # Generate 12-hour deterministic forecast
-    for i in range(1, 13):
-        h = (current_hour + i) % 24
-        
-
-        morning_peak = 18 * math.exp(-((h - 10)**2) / 6) 
-        evening_peak = 14 * math.exp(-((h - 20)**2) / 5)
-        
- 
-        base_inflow = 4 + morning_peak + evening_peak
-        
-        predicted_count = int(base_inflow * w_mult * saturation_factor)
-        forecast.append({"hour": f"{h}:00", "inflow": predicted_count})
-        total_val += predicted_count
+    hourly, saturation_factor, historical = forecast_hourly_inflow(db, w_mult)
+    forecast = [{"hour": label, "inflow": int(value)} for label, value in hourly]
+    total_val = sum(f["inflow"] for f in forecast)
     
     peak_entry = max(forecast, key=lambda x: x["inflow"])
     return {
@@ -582,10 +774,116 @@ async def predict_inflow(db: Session = Depends(get_db)):
         "confidence_score": 95, 
         "factors": {
             "environmental": f"{round(w_mult, 2)}x",
-            "systemic_saturation": f"{round(saturation_factor, 2)}x"
+            "systemic_saturation": f"{round(saturation_factor, 2)}x",
+            "baseline": "historical" if historical else "modeled"
         }
     }
 
+async def capacity_projection(db: Session, replications: int = capacity_sim.DEFAULT_REPLICATIONS, horizon_hours: int = 12):
+    weather = await WeatherService.get_weather_coefficient()
+    # Snapshot and forecast scan rollups and recent history; keep them off the event loop
+    hourly, _, _ = await run_in_threadpool(forecast_hourly_inflow, db, weather["multiplier"], horizon_hours)
+    state = await run_in_threadpool(capacity_sim.snapshot_state, db)
+    return await capacity_sim.project(state, [value for _, value in hourly], replications)
+
+@app.get("/api/capacity/projection")
+async def get_capacity_projection(replications: int = capacity_sim.DEFAULT_REPLICATIONS, horizon_hours: int = 12, db: Session = Depends(get_db)):
+    if not (100 <= replications <= 50000) or not (1 <= horizon_hours <= 72):
+        raise HTTPException(status_code=400, detail="replications must be 100-50000 and horizon_hours 1-72")
+    projection = await capacity_projection(db, replications, horizon_hours)
+    return projection.summary()
+
+@app.on_event("startup")
+async def start_simulation_pool():
+    asyncio.create_task(warm_simulation_pool())
+
+async def warm_simulation_pool():
+    try:
+        await capacity_sim.warm_pool()
+    except Exception:
+        logger.exception("Simulation pool warm-up failed")
+
+@app.on_event("shutdown")
+def stop_simulation_pool():
+    capacity_sim.shutdown_pool()
+
+# --- Analytics (served from hourly rollups) ---
+
+@app.get("/api/analytics/census")
+def get_census_trend(days: int = 90, department: Optional[str] = None, bucket: str = "day", db: Session = Depends(get_db)):
+    if bucket not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="bucket must be 'hour' or 'day'")
+    return {"department": department or "ALL", "bucket": bucket, "series": rollups.census_series(db, days, department, bucket)}
+
+@app.get("/api/analytics/los")
+def get_length_of_stay(days: int = 90, department: Optional[str] = None, db: Session = Depends(get_db)):
+    return {"department": department or "ALL", **rollups.los_summary(db, days, department)}
+
+@app.get("/api/analytics/arrivals-profile")
+def get_arrivals_profile(days: int = 28, db: Session = Depends(get_db)):
+    profile = rollups.hourly_arrival_profile(db, days)
+    return {
+        "days": days,
+        "has_history": profile is not None,
+        "profile": [{"hour": f"{h}:00", "avg_arrivals": round(v, 2)} for h, v in enumerate(profile or [])]
+    }
+
+# --- Live Telemetry (in-memory ring buffer) ---
+
+def sample_once():
+    db = SessionLocal()
+    try:
+        telemetry.buffer.append(time.time(), telemetry.take_sample(db))
+    finally:
+        db.close()
+
+async def telemetry_loop():
+    samples = 0
+    while True:
+        try:
+            await run_in_threadpool(sample_once)
+            samples += 1
+            # Every worker samples, but only the bus leader spills to the shared file
+            if samples % telemetry.SPILL_EVERY_SAMPLES == 0 and manager.bus.is_leader:
+                await run_in_threadpool(telemetry.buffer.save, telemetry.SPILL_PATH)
+        except Exception:
+            logger.exception("Telemetry sample failed")
+        await asyncio.sleep(telemetry.SAMPLE_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_telemetry():
+    telemetry.buffer.load(telemetry.SPILL_PATH)
+    asyncio.create_task(telemetry_loop())
+
+@app.on_event("shutdown")
+def spill_telemetry():
+    if manager.bus.is_leader:
+        telemetry.buffer.save(telemetry.SPILL_PATH)
+
+@app.get("/api/telemetry/series")
+def get_telemetry_series(hours: float = 24, points: int = 288, format: str = "json"):
+    # Served entirely from memory; never touches the database
+    end = time.time()
+    ts, vals = telemetry.buffer.window(end - hours * 3600, end, max(points, 1))
+
+    if format == "binary":
+        return Response(
+            content=telemetry.encode_binary(ts, vals),
+            media_type="application/octet-stream",
+            headers={"X-Series": ",".join(telemetry.SERIES)}
+        )
+
+    return {
+        "series": telemetry.SERIES,
+        "interval_seconds": telemetry.SAMPLE_INTERVAL_SECONDS,
+        "timestamps": [round(t, 3) for t in ts.tolist()],
+        "values": {name: [round(v, 2) for v in vals[:, i].tolist()] for i, name in enumerate(telemetry.SERIES)}
+    }
+
+@app.get("/api/metrics/admission")
+def get_admission_metrics():
+    return admission.current_snapshot()
+
 # --- Sentinel Flow Endpoints ---
 
 @app.post("/api/events")
@@ -600,31 +898,73 @@ def log_event(event: EventCreate, db: Session = Depends(get_db)):
     db.commit()
     return {"status": "success", "event_id": new_event.id}
 
-@app.get("/api/metrics/latency")
-def get_latency_metrics(db: Session = Depends(get_db)):
-    # Calculate average time between TRANSFER_START and TRANSFER_COMPLETE in last 24h
-    completed_transfers = db.query(models.Event).filter(
-        models.Event.event_type == "TRANSFER_COMPLETE"
-    ).order_by(models.Event.timestamp.desc()).limit(100).all()
-    
-    total_latency = 0
-    count = 0
-    
-    for end_event in completed_transfers:
+# A transfer that started longer than this before it completed is not paired from the archive
+TRANSFER_LOOKBACK_DAYS = 7
+# Completions older than this are not pulled back from the archive for the latency metrics
+TRANSFER_HISTORY_DAYS = 90
+
+def archived_transfer_starts(completed: List[dict]) -> dict:
+    # Only the archived days that can hold a start for these completions are read
+    start_day = min(e["timestamp"] for e in completed).date() - timedelta(days=TRANSFER_LOOKBACK_DAYS)
+    end_day = max(e["timestamp"] for e in completed).date()
+    starts = {}
+    for row in archive.read_events(start_day, end_day, ["TRANSFER_START"], columns=["patient_id", "timestamp"]):
+        starts.setdefault(row["patient_id"], []).append(row["timestamp"])
+    return starts
+
+def recent_transfer_latencies(db: Session, limit: int) -> List[float]:
+    # Minutes between each of the latest `limit` TRANSFER_COMPLETE events and its TRANSFER_START
+    completed = [
+        {"patient_id": e.patient_id, "timestamp": e.timestamp}
+        for e in db.query(models.Event).filter(
+            models.Event.event_type == "TRANSFER_COMPLETE"
+        ).order_by(models.Event.timestamp.desc()).limit(limit).all()
+    ]
+
+    archived_days = archive.archived_days("events")
+    if len(completed) < limit:
+        # Older completions have been rolled into the archive
+        oldest = datetime.utcnow().date() - timedelta(days=TRANSFER_HISTORY_DAYS)
+        for day in reversed(archived_days):
+            if day < oldest:
+                break
+            rows = archive.read_events(day, day, ["TRANSFER_COMPLETE"], columns=["patient_id", "timestamp"])
+            completed.extend(sorted(rows, key=lambda r: r["timestamp"], reverse=True))
+            if len(completed) >= limit:
+                break
+        completed = completed[:limit]
+
+    archived_starts = None
+    latencies = []
+    for end_event in completed:
         # Find corresponding start event
         start_event = db.query(models.Event).filter(
-            models.Event.patient_id == end_event.patient_id,
+            models.Event.patient_id == end_event["patient_id"],
             models.Event.event_type == "TRANSFER_START",
-            models.Event.timestamp < end_event.timestamp
+            models.Event.timestamp < end_event["timestamp"]
         ).order_by(models.Event.timestamp.desc()).first()
-        
-        if start_event:
-            delta = (end_event.timestamp - start_event.timestamp).total_seconds() / 60 # minutes
-            total_latency += delta
-            count += 1
+        start_time = start_event.timestamp if start_event else None
+
+        if start_time is None and archived_days:
+            if archived_starts is None:
+                archived_starts = archived_transfer_starts(completed)
+            earliest = end_event["timestamp"] - timedelta(days=TRANSFER_LOOKBACK_DAYS)
+            start_time = max((
+                ts for ts in archived_starts.get(end_event["patient_id"], [])
+                if earliest <= ts < end_event["timestamp"]
+            ), default=None)
+
+        if start_time:
+            latencies.append((end_event["timestamp"] - start_time).total_seconds() / 60) # minutes
+
+    return latencies
+
+@app.get("/api/metrics/latency")
+def get_latency_metrics(db: Session = Depends(get_db)):
+    latencies = recent_transfer_latencies(db, 100)
             
-    avg_latency = total_latency / count if count > 0 else 0
-    throughput = count 
+    avg_latency = sum(latencies) / len(latencies) if latencies else 0
+    throughput = len(latencies) 
     latency_score = min(avg_latency * 2, 100) 
     
     return {
@@ -651,30 +991,41 @@ def create_prediction(pred: PredictionCreate, db: Session = Depends(get_db)):
     return {"status": "success"}
 
 def calculate_latency_score(db: Session):
-    completed_transfers = db.query(models.Event).filter(
-        models.Event.event_type == "TRANSFER_COMPLETE"
-    ).order_by(models.Event.timestamp.desc()).limit(20).all()
-    
-    if not completed_transfers: return 0
-    
-    total_latency = 0
-    count = 0
-    for end_event in completed_transfers:
-        start_event = db.query(models.Event).filter(
-            models.Event.patient_id == end_event.patient_id,
-            models.Event.event_type == "TRANSFER_START",
-            models.Event.timestamp < end_event.timestamp
-        ).order_by(models.Event.timestamp.desc()).first()
-        if start_event:
-            delta = (end_event.timestamp - start_event.timestamp).total_seconds() / 60
-            total_latency += delta
-            count += 1
-            
-    avg = total_latency / count if count > 0 else 0
+    latencies = recent_transfer_latencies(db, 20)
+    avg = sum(latencies) / len(latencies) if latencies else 0
     return min(avg * 2, 100)
 
-@app.get("/api/alerts/active")
-def get_active_alerts(db: Session = Depends(get_db)):
+@app.post("/api/admin/archive")
+def run_archive(retention_days: int = archive.RETENTION_DAYS, db: Session = Depends(get_db)):
+    if retention_days < 1:
+        # Anything shorter would archive (and delete) encounters closed today
+        raise HTTPException(status_code=400, detail="retention_days must be at least 1")
+    return archive.run_archival(db, retention_days)
+
+ARCHIVE_INTERVAL_SECONDS = 6 * 60 * 60
+
+def archive_once():
+    db = SessionLocal()
+    try:
+        return archive.run_archival(db)
+    finally:
+        db.close()
+
+async def archive_loop():
+    while True:
+        try:
+            # With several workers only the bus leader archives, so day files have a single writer
+            if manager.bus.is_leader:
+                await run_in_threadpool(archive_once)
+        except Exception:
+            logger.exception("Archival run failed")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+@app.on_event("startup")
+async def start_archiver():
+    asyncio.create_task(archive_loop())
+
+def active_alerts(db: Session):
     alerts = []
     
     
@@ -694,5 +1045,97 @@ def get_active_alerts(db: Session = Depends(get_db)):
         
     return {"alerts": alerts}
 
+@app.get("/api/alerts/active")
+def get_active_alerts(db: Session = Depends(get_db)):
+    return active_alerts(db)
+
+# --- Search ---
+
+SEARCH_KINDS = ["patient", "bed", "event"]
+
+@app.get("/api/search")
+def search_records(q: str, kinds: Optional[str] = None, esi_level: Optional[int] = None,
+                   start: Optional[date] = None, end: Optional[date] = None,
+                   page: int = 1, page_size: int = 20, db: Session = Depends(get_db)):
+    kind_list = [k.strip() for k in kinds.split(",") if k.strip()] if kinds else None
+    if kind_list and any(k not in SEARCH_KINDS for k in kind_list):
+        raise HTTPException(status_code=400, detail=f"kinds must be among {', '.join(SEARCH_KINDS)}")
+    if page < 1 or not (1 <= page_size <= 100):
+        raise HTTPException(status_code=400, detail="page must be >= 1 and page_size 1-100")
+    return search.search(db, q, kind_list, esi_level, start, end, page, page_size)
+
+@app.get("/api/search/suggest")
+def search_suggest(q: str, limit: int = 8, db: Session = Depends(get_db)):
+    # Search-as-you-type: top hits for the partial query, labels only
+    found = search.search(db, q, page_size=max(1, min(limit, 20)))
+    return {
+        "suggestions": [{"kind": r["kind"], "id": r["id"], "label": r["label"]} for r in found["results"]],
+        "corrections": found["corrections"]
+    }
+
+# --- Dashboard Bootstrap ---
+
+BOOTSTRAP_VIEWS = ["beds", "stats", "ambulances", "staff", "predictions", "alerts"]
+
+def row_dict(obj):
+    return {c.name: getattr(obj, c.name) for c in obj.__table__.columns}
+
+def select_fields(view, keep):
+    if not keep:
+        return view
+    if isinstance(view, list):
+        return [{k: v for k, v in item.items() if k in keep} for item in view]
+    return {k: v for k, v in view.items() if k in keep}
+
+@app.get("/api/bootstrap")
+def bootstrap(views: Optional[str] = None, fields: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Any subset of the dashboard views in one round trip.
+    views=beds,stats  fields=beds.id,beds.is_occupied,stats.occupancy
+    """
+    requested = [v.strip() for v in views.split(",") if v.strip()] if views else BOOTSTRAP_VIEWS
+    unknown = [v for v in requested if v not in BOOTSTRAP_VIEWS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown views: {', '.join(unknown)}")
+
+    keep = {}
+    for f in (fields or "").split(","):
+        if "." in f:
+            view, field = f.strip().split(".", 1)
+            keep.setdefault(view, set()).add(field)
+
+    result = {}
+    # One read transaction so every view reflects the same snapshot
+    db.execute(text("BEGIN"))
+    try:
+        beds = db.query(models.BedModel).all() if {"beds", "stats"} & set(requested) else []
+        ambulances = db.query(models.Ambulance).all() if {"ambulances", "stats"} & set(requested) else []
+        staff = db.query(models.Staff).all() if {"staff", "stats"} & set(requested) else []
+
+        if "beds" in requested:
+            result["beds"] = [row_dict(b) for b in beds]
+        if "stats" in requested:
+            result["stats"] = dashboard_stats_from(beds, ambulances, staff)
+        if "ambulances" in requested:
+            result["ambulances"] = [row_dict(a) for a in ambulances]
+        if "staff" in requested:
+            assignments = db.query(models.BedAssignment).filter(models.BedAssignment.is_active == True).all()
+            view = staff_view(staff, assignments)
+            view["staff"] = [row_dict(s) for s in view["staff"]]
+            view["assignments"] = [row_dict(a) for a in view["assignments"]]
+            result["staff"] = view
+        if "predictions" in requested:
+            result["predictions"] = [row_dict(p) for p in db.query(models.PredictionLog).order_by(models.PredictionLog.timestamp.desc()).limit(10).all()]
+        if "alerts" in requested:
+            result["alerts"] = active_alerts(db)
+    finally:
+        db.rollback()
+
+    return {view: select_fields(data, keep.get(view)) for view, data in result.items()}
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv("PHRELIS_WORKERS", "1"))
+    if workers > 1:
+        # Process-local broadcasts would only reach clients of the same worker
+        os.environ.setdefault("PHRELIS_BROADCAST_BACKEND", "unix")
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, JSON, DateTime, Float
+from sqlalchemy import Column, Integer, String, Boolean, JSON, DateTime, Float, UniqueConstraint
 from datetime import datetime
 from database import Base
 
@@ -112,3 +112,45 @@ class PredictionLog(Base):
     prediction_text = Column(String) 
     target_department = Column(String) # ICU, ER
     predicted_delay_minutes = Column(Integer)
+
+class TriageRule(Base):
+    __tablename__ = "triage_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    symptom = Column(String, unique=True, index=True) # "chest pain"
+    esi_level = Column(Integer)
+    is_active = Column(Boolean, default=True)
+
+class VitalsBand(Base):
+    __tablename__ = "vitals_bands"
+
+    id = Column(Integer, primary_key=True, index=True)
+    vital = Column(String) # spo2, heart_rate, resp_rate, systolic_bp, temperature
+    min_value = Column(Float, nullable=True) # exclusive, None = unbounded
+    max_value = Column(Float, nullable=True) # exclusive, None = unbounded
+    esi_level = Column(Integer, nullable=True) # None = flag-only band
+    requires_ventilator = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=True)
+
+class HourlyRollup(Base):
+    __tablename__ = "hourly_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    department = Column(String, index=True) # ICU, ER, Wards, Surgery
+    hour_start = Column(DateTime, index=True)
+    arrivals = Column(Integer, default=0)
+    discharges = Column(Integer, default=0)
+    occupied_minutes = Column(Float, default=0.0) # bed-minutes of closed encounters in this hour
+    ventilator_minutes = Column(Float, default=0.0)
+    los_histogram = Column(JSON) # discharge counts per rollups.LOS_BUCKETS_MINUTES bucket
+
+class SearchDoc(Base):
+    __tablename__ = "search_docs"
+    __table_args__ = (UniqueConstraint("kind", "ref_id"),)
+
+    id = Column(Integer, primary_key=True, index=True) # rowid in the search_index FTS table
+    kind = Column(String) # patient, bed, event
+    ref_id = Column(String)
+    label = Column(String)
+    timestamp = Column(DateTime, nullable=True, index=True)
+    esi_level = Column(Integer, nullable=True, index=True)
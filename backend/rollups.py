@@ -0,0 +1,226 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+
+
+# Upper edges of the length-of-stay histogram; the last bucket is open-ended
+LOS_BUCKETS_MINUTES = [30, 60, 120, 240, 480, 720, 1440, 2880, 4320, 10080]
+
+# The arrival profile replaces the modeled baseline only with this much history behind it
+MIN_PROFILE_DAYS = 3
+MIN_PROFILE_ARRIVALS = 100
+
+
+def hour_floor(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _empty_histogram() -> List[int]:
+    return [0] * (len(LOS_BUCKETS_MINUTES) + 1)
+
+
+def _get_row(db: Session, department: str, hour_start: datetime) -> models.HourlyRollup:
+    row = db.query(models.HourlyRollup).filter(
+        models.HourlyRollup.department == department,
+        models.HourlyRollup.hour_start == hour_start
+    ).first()
+    if not row:
+        row = models.HourlyRollup(
+            department=department, hour_start=hour_start,
+            arrivals=0, discharges=0, occupied_minutes=0.0, ventilator_minutes=0.0,
+            los_histogram=_empty_histogram()
+        )
+        db.add(row)
+        db.flush()
+    return row
+
+
+def hour_overlaps(start: datetime, end: datetime):
+    """Yield (hour_start, minutes) for every hour touched by [start, end)."""
+    hour = hour_floor(start)
+    while hour < end:
+        next_hour = hour + timedelta(hours=1)
+        minutes = (min(end, next_hour) - max(start, hour)).total_seconds() / 60
+        if minutes > 0:
+            yield hour, minutes
+        hour = next_hour
+
+
+def record_arrival(db: Session, department: str, ts: Optional[datetime] = None):
+    row = _get_row(db, department, hour_floor(ts or datetime.utcnow()))
+    row.arrivals += 1
+
+
+def record_discharge(db: Session, department: str, admitted_at: Optional[datetime],
+                     discharged_at: Optional[datetime] = None, ventilator: bool = False):
+    discharged_at = discharged_at or datetime.utcnow()
+    row = _get_row(db, department, hour_floor(discharged_at))
+    row.discharges += 1
+
+    if not admitted_at or admitted_at >= discharged_at:
+        return
+
+    los_minutes = (discharged_at - admitted_at).total_seconds() / 60
+    histogram = list(row.los_histogram or _empty_histogram())
+    histogram[bisect_left(LOS_BUCKETS_MINUTES, los_minutes)] += 1
+    row.los_histogram = histogram # reassign so the JSON column is flagged dirty
+
+    for hour, minutes in hour_overlaps(admitted_at, discharged_at):
+        spread = _get_row(db, department, hour)
+        spread.occupied_minutes += minutes
+        if ventilator:
+            spread.ventilator_minutes += minutes
+
+
+def backfill_from_history(db: Session) -> int:
+    """Seed the rollups from PatientRecord when the table is empty (department inferred from ESI)."""
+    if db.query(models.HourlyRollup).count() > 0:
+        return 0
+
+    count = 0
+    for record in db.query(models.PatientRecord).all():
+        if not record.timestamp:
+            continue
+        department = "ICU" if (record.esi_level or 3) <= 2 else "ER"
+        record_arrival(db, department, record.timestamp)
+        if record.discharge_time:
+            ventilator = "Ventilator" in (record.acuity or "")
+            record_discharge(db, department, record.timestamp, record.discharge_time, ventilator)
+        count += 1
+    db.commit()
+    return count
+
+
+def percentile_from_histogram(histogram: List[int], q: float) -> Optional[float]:
+    total = sum(histogram)
+    if total == 0:
+        return None
+    target = q * total
+    cumulative = 0
+    for i, count in enumerate(histogram):
+        if count and cumulative + count >= target:
+            lower = LOS_BUCKETS_MINUTES[i - 1] if i > 0 else 0
+            if i == len(LOS_BUCKETS_MINUTES):
+                return float(lower)
+            upper = LOS_BUCKETS_MINUTES[i]
+            return lower + (upper - lower) * (target - cumulative) / count
+        cumulative += count
+    return float(LOS_BUCKETS_MINUTES[-1])
+
+
+def _live_minutes(db: Session, since: datetime, now: datetime, department: Optional[str]):
+    # Open encounters have not been rolled up yet; add their partial stay on the fly
+    query = db.query(models.BedModel).filter(models.BedModel.is_occupied == True)
+    if department:
+        query = query.filter(models.BedModel.type == department)
+
+    occupied, ventilator = {}, {}
+    for bed in query.all():
+        if not bed.admission_time:
+            continue
+        for hour, minutes in hour_overlaps(max(bed.admission_time, since), now):
+            occupied[hour] = occupied.get(hour, 0) + minutes
+            if bed.ventilator_in_use:
+                ventilator[hour] = ventilator.get(hour, 0) + minutes
+    return occupied, ventilator
+
+
+def census_series(db: Session, days: int = 90, department: Optional[str] = None, bucket: str = "day") -> List[dict]:
+    now = datetime.utcnow()
+    since = hour_floor(now - timedelta(days=days))
+
+    query = db.query(
+        models.HourlyRollup.hour_start,
+        func.sum(models.HourlyRollup.arrivals),
+        func.sum(models.HourlyRollup.discharges),
+        func.sum(models.HourlyRollup.occupied_minutes),
+        func.sum(models.HourlyRollup.ventilator_minutes),
+    ).filter(models.HourlyRollup.hour_start >= since)
+    if department:
+        query = query.filter(models.HourlyRollup.department == department)
+    rows = query.group_by(models.HourlyRollup.hour_start).all()
+
+    live_occ, live_vent = _live_minutes(db, since, now, department)
+
+    series = {}
+    for hour, arrivals, discharges, occ, vent in rows:
+        series[hour] = [arrivals or 0, discharges or 0, occ or 0.0, vent or 0.0]
+    for hour, minutes in live_occ.items():
+        series.setdefault(hour, [0, 0, 0.0, 0.0])[2] += minutes
+    for hour, minutes in live_vent.items():
+        series.setdefault(hour, [0, 0, 0.0, 0.0])[3] += minutes
+
+    hours_per_bucket = 24 if bucket == "day" else 1
+    buckets = {}
+    for hour, (arrivals, discharges, occ, vent) in series.items():
+        key = hour.replace(hour=0) if bucket == "day" else hour
+        b = buckets.setdefault(key, [0, 0, 0.0, 0.0])
+        b[0] += arrivals
+        b[1] += discharges
+        b[2] += occ
+        b[3] += vent
+
+    return [
+        {
+            "period_start": key.isoformat(),
+            "arrivals": b[0],
+            "discharges": b[1],
+            "avg_occupancy": round(b[2] / (60 * hours_per_bucket), 2),
+            "ventilator_hours": round(b[3] / 60, 2),
+        }
+        for key, b in sorted(buckets.items())
+    ]
+
+
+def los_summary(db: Session, days: int = 90, department: Optional[str] = None) -> dict:
+    since = hour_floor(datetime.utcnow() - timedelta(days=days))
+    query = db.query(models.HourlyRollup.los_histogram).filter(models.HourlyRollup.hour_start >= since)
+    if department:
+        query = query.filter(models.HourlyRollup.department == department)
+
+    merged = _empty_histogram()
+    for (histogram,) in query.all():
+        for i, count in enumerate(histogram or []):
+            merged[i] += count
+
+    return {
+        "discharges": sum(merged),
+        "p50_minutes": percentile_from_histogram(merged, 0.5),
+        "p90_minutes": percentile_from_histogram(merged, 0.9),
+        "p95_minutes": percentile_from_histogram(merged, 0.95),
+        "bucket_edges_minutes": LOS_BUCKETS_MINUTES,
+        "histogram": merged,
+    }
+
+
+def hourly_arrival_profile(db: Session, days: int = 28) -> Optional[List[float]]:
+    """Mean arrivals per hour of day over the last `days`, or None without enough history."""
+    since = hour_floor(datetime.utcnow() - timedelta(days=days))
+    rows = db.query(
+        models.HourlyRollup.hour_start,
+        func.sum(models.HourlyRollup.arrivals)
+    ).filter(
+        models.HourlyRollup.hour_start >= since,
+        # Discharges spread zero-arrival rows back to each admission hour; they must not stretch the span
+        models.HourlyRollup.arrivals > 0
+    ).group_by(models.HourlyRollup.hour_start).all()
+
+    if not rows:
+        return None
+    # Quiet days have no rollup rows, so average over the whole span rather than the days seen
+    span_days = (datetime.utcnow().date() - min(hour for hour, _ in rows).date()).days + 1
+    if span_days < MIN_PROFILE_DAYS:
+        return None
+
+    totals = [0] * 24
+    for hour, arrivals in rows:
+        totals[hour.hour] += arrivals or 0
+    # A handful of old arrivals would otherwise flatten the forecast to near zero
+    if sum(totals) < MIN_PROFILE_ARRIVALS:
+        return None
+    return [t / span_days for t in totals]
@@ -0,0 +1,258 @@
+import re
+import unicodedata
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import event, select, text
+from sqlalchemy.orm import Session
+
+import models
+
+
+# Unicode word runs without "_", which unicode61 treats as a separator
+TOKEN_RE = re.compile(r"[^\W_]+")
+MAX_FUZZY_CANDIDATES = 5
+KIND_BY_MODEL = {
+    models.PatientRecord: "patient",
+    models.BedModel: "bed",
+    models.Event: "event",
+}
+
+docs = models.SearchDoc.__table__
+
+
+def ensure_index(engine):
+    # FTS5 tables are virtual, so they are created here rather than by create_all
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "title, body, tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+        ))
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS search_vocab USING fts5vocab(search_index, 'row')"))
+
+
+def _document(kind: str, obj):
+    """(ref_id, label, title, body, timestamp, esi_level) for an indexed row."""
+    if kind == "patient":
+        symptoms = obj.symptoms if isinstance(obj.symptoms, list) else []
+        body = " ".join(str(s) for s in [obj.condition, obj.acuity, *symptoms] if s)
+        return obj.id, obj.patient_name or "Unknown Patient", obj.patient_name or "", body, obj.timestamp, obj.esi_level
+    if kind == "bed":
+        body = " ".join(s for s in [obj.patient_name, obj.condition] if s) if obj.is_occupied else ""
+        ts = obj.admission_time if obj.is_occupied else None
+        return obj.id, obj.id, f"{obj.id} {obj.type}", body, ts, None
+    body = " ".join(s for s in [obj.details, obj.patient_id] if s)
+    return str(obj.id), obj.event_type, (obj.event_type or "").replace("_", " "), body, obj.timestamp, None
+
+
+def index_document(connection, kind: str, obj):
+    ref_id, label, title, body, ts, esi_level = _document(kind, obj)
+    doc_id = connection.execute(select(docs.c.id).where(docs.c.kind == kind, docs.c.ref_id == ref_id)).scalar()
+    if doc_id is None:
+        doc_id = connection.execute(docs.insert().values(
+            kind=kind, ref_id=ref_id, label=label, timestamp=ts, esi_level=esi_level
+        )).inserted_primary_key[0]
+    else:
+        connection.execute(docs.update().where(docs.c.id == doc_id).values(label=label, timestamp=ts, esi_level=esi_level))
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :id"), {"id": doc_id})
+    connection.execute(
+        text("INSERT INTO search_index(rowid, title, body) VALUES (:id, :title, :body)"),
+        {"id": doc_id, "title": title, "body": body}
+    )
+
+
+def remove_document(connection, kind: str, ref_id: str):
+    doc_id = connection.execute(select(docs.c.id).where(docs.c.kind == kind, docs.c.ref_id == ref_id)).scalar()
+    if doc_id is not None:
+        connection.execute(text("DELETE FROM search_index WHERE rowid = :id"), {"id": doc_id})
+        connection.execute(docs.delete().where(docs.c.id == doc_id))
+
+
+def register_listeners():
+    # Index writes ride on the ORM flush, so they commit or roll back with the row itself.
+    # Bulk query.delete() (used by archival) bypasses these, which keeps archived rows searchable.
+    for model, kind in KIND_BY_MODEL.items():
+        def on_write(mapper, connection, target, kind=kind):
+            index_document(connection, kind, target)
+
+        def on_delete(mapper, connection, target, kind=kind):
+            remove_document(connection, kind, _document(kind, target)[0])
+
+        event.listen(model, "after_insert", on_write)
+        event.listen(model, "after_update", on_write)
+        event.listen(model, "after_delete", on_delete)
+
+
+def rebuild_if_empty(db: Session) -> int:
+    if db.query(models.SearchDoc).count() > 0:
+        return 0
+    connection = db.connection()
+    count = 0
+    for model, kind in KIND_BY_MODEL.items():
+        for obj in db.query(model).all():
+            index_document(connection, kind, obj)
+            count += 1
+    db.commit()
+    return count
+
+
+def _fold(ch: str) -> str:
+    # Mirrors remove_diacritics 2: Latin letters lose their combining marks, other scripts keep them
+    decomposed = unicodedata.normalize("NFD", ch)
+    if (len(decomposed) > 1 and unicodedata.name(decomposed[0], "").startswith("LATIN")
+            and all(0x300 <= ord(m) <= 0x36f for m in decomposed[1:])):
+        return decomposed[0]
+    return ch
+
+
+def tokenize(q: str) -> List[str]:
+    """Query terms as the index's unicode61 tokenizer would produce them."""
+    return TOKEN_RE.findall("".join(_fold(ch) for ch in q.lower()))
+
+
+def _prefix_distances(a: str, b: str, limit: int) -> Optional[List[int]]:
+    """
+    Levenshtein distance (with adjacent transpositions) from `a` to every prefix
+    of `b`, indexed by prefix length; None once every prefix exceeds `limit`.
+    """
+    before, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if before and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            cur.append(cost)
+        if min(cur) > limit:
+            return None
+        before, prev = prev, cur
+    return prev
+
+
+def _vocab_has(connection, term: str, prefix: bool) -> bool:
+    if prefix:
+        row = connection.execute(
+            text("SELECT 1 FROM search_vocab WHERE term >= :lo AND term < :hi LIMIT 1"),
+            {"lo": term, "hi": term + "\uffff"}
+        ).first()
+    else:
+        row = connection.execute(text("SELECT 1 FROM search_vocab WHERE term = :t"), {"t": term}).first()
+    return row is not None
+
+
+def _fuzzy_candidates(connection, term: str):
+    """
+    Indexed prefixes within edit distance of `term` (most frequent first), plus
+    the full indexed word to report as the correction.
+    """
+    # The first letter (first two for longer words) is trusted: the anchor keeps the vocab scan short
+    anchor = term[:2] if len(term) > 5 else term[:1]
+    limit = 1 if len(term) <= 5 else 2
+    rows = connection.execute(
+        text("SELECT term, doc FROM search_vocab WHERE term >= :lo AND term < :hi"),
+        {"lo": anchor, "hi": anchor + "\uffff"}
+    ).all()
+
+    scored, correction = {}, None
+    for candidate, doc_count in rows:
+        # Prefix lengths either side of len(term), so dropped and extra letters both line up
+        window = candidate[:len(term) + limit]
+        # Each letter of `term` missing from the window costs at least one edit
+        if sum(ch not in window for ch in term) > limit:
+            continue
+        distances = _prefix_distances(term, window, limit)
+        if distances is None:
+            continue
+        best = None
+        for n in range(max(1, len(term) - limit), len(distances)):
+            key = (distances[n], abs(n - len(term)))
+            if distances[n] <= limit and (best is None or key < best[0]):
+                best = (key, candidate[:n])
+        if best is None:
+            continue
+        (distance, _), stem = best
+        rank = (distance, -doc_count)
+        if stem not in scored or rank < scored[stem]:
+            scored[stem] = rank
+        if correction is None or rank < correction[0]:
+            correction = (rank, candidate)
+
+    stems = [c for c, _ in sorted(scored.items(), key=lambda kv: kv[1])[:MAX_FUZZY_CANDIDATES]]
+    return stems, correction[1] if correction else None
+
+
+def build_match(connection, q: str):
+    """
+    FTS5 MATCH expression for a free-text query. Complete words match exactly,
+    the word being typed (or any unknown word) matches as a prefix, and words
+    with no indexed prefix are replaced by their closest spellings.
+    """
+    terms = tokenize(q)
+    clauses, corrections = [], {}
+    for i, term in enumerate(terms):
+        if i < len(terms) - 1 and _vocab_has(connection, term, prefix=False):
+            clauses.append(f'"{term}"')
+            continue
+        if _vocab_has(connection, term, prefix=True):
+            clauses.append(f'"{term}"*')
+            continue
+        candidates, correction = _fuzzy_candidates(connection, term)
+        if not candidates:
+            clauses.append(f'"{term}"*')
+            continue
+        corrections[term] = correction
+        clauses.append("(" + " OR ".join(f'"{c}"*' for c in candidates) + ")")
+    return " AND ".join(clauses), corrections
+
+
+def search(db: Session, q: str, kinds: Optional[List[str]] = None, esi_level: Optional[int] = None,
+           start: Optional[date] = None, end: Optional[date] = None, page: int = 1, page_size: int = 20) -> dict:
+    connection = db.connection()
+    match, corrections = build_match(connection, q)
+    if not match:
+        return {"results": [], "page": page, "page_size": page_size, "has_more": False, "corrections": {}}
+
+    where = ["search_index MATCH :match"]
+    params = {"match": match, "limit": page_size + 1, "offset": (page - 1) * page_size}
+    if kinds:
+        where.append("d.kind IN (" + ", ".join(f":kind{i}" for i in range(len(kinds))) + ")")
+        params.update({f"kind{i}": k for i, k in enumerate(kinds)})
+    if esi_level is not None:
+        where.append("d.esi_level = :esi")
+        params["esi"] = esi_level
+    # Timestamps are stored as ISO strings, so date bounds compare lexically
+    if start:
+        where.append("d.timestamp >= :start")
+        params["start"] = start.isoformat()
+    if end:
+        where.append("d.timestamp < :end")
+        params["end"] = (end + timedelta(days=1)).isoformat()
+
+    rows = connection.execute(text(
+        "SELECT d.kind, d.ref_id, d.label, d.timestamp, d.esi_level, "
+        "bm25(search_index, 2.0, 1.0) AS score, "
+        "snippet(search_index, 1, '[', ']', '...', 10) AS snippet "
+        "FROM search_index JOIN search_docs d ON d.id = search_index.rowid "
+        "WHERE " + " AND ".join(where) + " "
+        "ORDER BY score LIMIT :limit OFFSET :offset"
+    ), params).all()
+
+    results = [
+        {
+            "kind": r.kind,
+            "id": r.ref_id,
+            "label": r.label,
+            "timestamp": r.timestamp,
+            "esi_level": r.esi_level,
+            "snippet": r.snippet,
+            "score": round(-r.score, 4), # bm25 is lower-is-better
+        }
+        for r in rows[:page_size]
+    ]
+    return {
+        "results": results,
+        "page": page,
+        "page_size": page_size,
+        "has_more": len(rows) > page_size,
+        "corrections": corrections,
+    }
@@ -0,0 +1,117 @@
+import os
+import struct
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+
+
+SERIES = [
+    "occupancy_ICU",
+    "occupancy_ER",
+    "occupancy_Wards",
+    "occupancy_Surgery",
+    "ventilators_in_use",
+    "ambulances_idle",
+    "staff_clocked_in",
+]
+
+SAMPLE_INTERVAL_SECONDS = 30
+WINDOW_SECONDS = 24 * 60 * 60
+SPILL_EVERY_SAMPLES = 20 # ~10 minutes at the default interval
+SPILL_PATH = "./telemetry_ring.npz"
+
+
+class RingBuffer:
+    """Fixed-capacity time series: one float64 timestamp column plus one float32 column per series."""
+
+    def __init__(self, capacity: int, series: List[str]):
+        self.capacity = capacity
+        self.series = list(series)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(series)), dtype=np.float32)
+        self.head = 0 # next slot to write
+        self.size = 0
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+    def append(self, ts: float, row: List[float]):
+        with self._lock:
+            self.timestamps[self.head] = ts
+            self.values[self.head] = row
+            self.head = (self.head + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity)
+
+    def snapshot(self):
+        """Copies of the stored samples in chronological order."""
+        with self._lock:
+            if self.size < self.capacity:
+                return self.timestamps[:self.size].copy(), self.values[:self.size].copy()
+            order = np.r_[self.head:self.capacity, 0:self.head]
+            return self.timestamps[order], self.values[order]
+
+    def window(self, start: float, end: float, points: Optional[int] = None):
+        ts, vals = self.snapshot()
+        mask = (ts >= start) & (ts <= end)
+        ts, vals = ts[mask], vals[mask]
+        if not points or len(ts) <= points:
+            return ts, vals
+
+        # Mean per equal-width time bucket; empty buckets are dropped
+        edges = np.linspace(start, end, points + 1)
+        idx = np.clip(np.searchsorted(edges, ts, side="right") - 1, 0, points - 1)
+        counts = np.bincount(idx, minlength=points)
+        bucket_ts = np.bincount(idx, weights=ts, minlength=points)
+        bucket_vals = np.stack([np.bincount(idx, weights=vals[:, j], minlength=points) for j in range(vals.shape[1])], axis=1)
+        keep = counts > 0
+        return bucket_ts[keep] / counts[keep], (bucket_vals[keep] / counts[keep, None]).astype(np.float32)
+
+    def save(self, path: str):
+        ts, vals = self.snapshot()
+        # Per-process temp name so concurrent writers never share a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, timestamps=ts, values=vals, series=np.array(self.series))
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> int:
+        if not os.path.exists(path):
+            return 0
+        data = np.load(path)
+        if list(data["series"]) != self.series:
+            # Series layout changed since the spill; start from an empty window
+            return 0
+        ts, vals = data["timestamps"], data["values"]
+        keep = ts >= time.time() - WINDOW_SECONDS
+        ts, vals = ts[keep][-self.capacity:], vals[keep][-self.capacity:]
+        for t, row in zip(ts, vals):
+            self.append(float(t), row)
+        return len(ts)
+
+
+def encode_binary(ts: np.ndarray, vals: np.ndarray) -> bytes:
+    """<uint32 points><uint32 series> then float64 timestamps, then float32 values row-major (little-endian)."""
+    header = struct.pack("<II", len(ts), vals.shape[1])
+    return header + ts.astype("<f8").tobytes() + vals.astype("<f4").tobytes()
+
+
+def take_sample(db: Session) -> List[float]:
+    row = []
+    for unit in ("ICU", "ER", "Wards", "Surgery"):
+        row.append(db.query(models.BedModel).filter(
+            models.BedModel.type == unit,
+            models.BedModel.is_occupied == True
+        ).count())
+    row.append(db.query(models.BedModel).filter(models.BedModel.ventilator_in_use == True).count())
+    row.append(db.query(models.Ambulance).filter(models.Ambulance.status == "IDLE").count())
+    row.append(db.query(models.Staff).filter(models.Staff.is_clocked_in == True).count())
+    return row
+
+
+buffer = RingBuffer(WINDOW_SECONDS // SAMPLE_INTERVAL_SECONDS, SERIES)
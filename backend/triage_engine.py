@@ -0,0 +1,140 @@
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+import models
+
+
+# Column order of the vitals matrix used for batch scoring
+VITALS = ["spo2", "heart_rate", "resp_rate", "systolic_bp", "temperature"]
+
+DEFAULT_LEVEL = 3
+NO_MATCH = 99
+
+DEFAULT_SYMPTOM_RULES = [
+    ("chest pain", 1),
+    ("stroke", 1),
+    ("fever", 4),
+]
+
+# (vital, min_value, max_value, esi_level, requires_ventilator)
+# A band matches when min_value < value < max_value; None leaves that side open.
+DEFAULT_VITALS_BANDS = [
+    # Ventilator protocol: every ventilator band has to match
+    ("spo2", None, 60, None, True),
+    ("heart_rate", None, 60, None, True),
+]
+
+# ESI danger-zone vitals. Seeded inactive so triage keeps its symptom-only levels
+# until a site opts in via /api/triage/bands/{id}/active.
+DANGER_ZONE_BANDS = [
+    ("spo2", None, 92, 2, False),
+    ("heart_rate", 100, None, 2, False),
+    ("resp_rate", 20, None, 2, False),
+    ("resp_rate", None, 8, 2, False),
+    ("systolic_bp", None, 90, 2, False),
+    ("temperature", 40, None, 2, False),
+    ("temperature", None, 35, 2, False),
+]
+
+
+def normalize_symptom(symptom: str) -> str:
+    return " ".join(str(symptom).lower().split())
+
+
+class CompiledRules:
+    """Immutable snapshot of the rule tables, laid out for lookups and numpy scoring."""
+
+    def __init__(self, symptom_levels: dict, bands: list):
+        self.symptom_levels = symptom_levels
+
+        bands = [b for b in bands if b.vital in VITALS]
+        self.band_count = len(bands)
+        self.band_vital = np.array([VITALS.index(b.vital) for b in bands], dtype=np.intp)
+        self.band_min = np.array([-np.inf if b.min_value is None else b.min_value for b in bands], dtype=float)
+        self.band_max = np.array([np.inf if b.max_value is None else b.max_value for b in bands], dtype=float)
+        self.band_level = np.array([NO_MATCH if b.esi_level is None else b.esi_level for b in bands], dtype=np.int64)
+        self.band_vent = np.array([bool(b.requires_ventilator) for b in bands], dtype=bool)
+
+    def symptom_level(self, symptoms: List[str]) -> int:
+        lookup = self.symptom_levels
+        return min((lookup.get(normalize_symptom(s), NO_MATCH) for s in symptoms or []), default=NO_MATCH)
+
+
+def compile_rules(db: Session) -> CompiledRules:
+    symptom_levels = {}
+    rules = db.query(models.TriageRule).filter(models.TriageRule.is_active == True).all()
+    for rule in rules:
+        key = normalize_symptom(rule.symptom)
+        symptom_levels[key] = min(rule.esi_level, symptom_levels.get(key, NO_MATCH))
+
+    bands = db.query(models.VitalsBand).filter(models.VitalsBand.is_active == True).all()
+    return CompiledRules(symptom_levels, bands)
+
+
+def seed_default_rules(db: Session):
+    if db.query(models.TriageRule).count() == 0:
+        db.add_all([models.TriageRule(symptom=s, esi_level=lvl, is_active=True) for s, lvl in DEFAULT_SYMPTOM_RULES])
+    if db.query(models.VitalsBand).count() == 0:
+        seeded = [(band, True) for band in DEFAULT_VITALS_BANDS] + [(band, False) for band in DANGER_ZONE_BANDS]
+        db.add_all([
+            models.VitalsBand(vital=v, min_value=lo, max_value=hi, esi_level=lvl, requires_ventilator=vent, is_active=active)
+            for (v, lo, hi, lvl, vent), active in seeded
+        ])
+    db.commit()
+
+
+def _vital_value(vitals: Optional[dict], name: str) -> float:
+    value = (vitals or {}).get(name)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TriageEngine:
+    def __init__(self):
+        self._rules = CompiledRules({}, [])
+        self._lock = threading.Lock()
+
+    @property
+    def rules(self) -> CompiledRules:
+        return self._rules
+
+    def reload(self, db: Session) -> dict:
+        # Reloads are serialized; in-flight requests keep scoring against the old snapshot until the swap
+        with self._lock:
+            compiled = compile_rules(db)
+            self._rules = compiled
+        return {"symptom_rules": len(compiled.symptom_levels), "vitals_bands": compiled.band_count}
+
+    def score(self, symptoms: List[str], vitals: Optional[dict] = None) -> Tuple[int, bool]:
+        levels, vents = self.score_batch([symptoms], [vitals])
+        return int(levels[0]), bool(vents[0])
+
+    def score_batch(self, symptom_lists: List[List[str]], vitals_list: List[Optional[dict]]):
+        rules = self._rules
+        n = len(symptom_lists)
+
+        symptom_levels = np.fromiter((rules.symptom_level(s) for s in symptom_lists), dtype=np.int64, count=n)
+
+        matrix = np.array([[_vital_value(v, name) for name in VITALS] for v in vitals_list], dtype=float).reshape(n, len(VITALS))
+        values = matrix[:, rules.band_vital]
+        # NaN (missing vital) compares False, so absent vitals never match a band
+        hits = (values > rules.band_min) & (values < rules.band_max)
+
+        band_levels = np.where(hits, rules.band_level, NO_MATCH).min(axis=1, initial=NO_MATCH)
+        levels = np.minimum(symptom_levels, band_levels)
+        levels[levels == NO_MATCH] = DEFAULT_LEVEL
+
+        if rules.band_vent.any():
+            ventilator = hits[:, rules.band_vent].all(axis=1)
+        else:
+            ventilator = np.zeros(n, dtype=bool)
+
+        return levels, ventilator
+
+
+engine = TriageEngine()
@@ -24,12 +24,10 @@ const AdminPanel = () => {
 
   const fetchERPData = async () => {
     try {
-      const [bedsRes, ambRes] = await Promise.all([
-        fetch(endpoints.beds),
-        fetch(endpoints.ambulances)
-      ]);
-      const bedsData = await bedsRes.json();
-      const ambData = await ambRes.json();
+      // Beds and fleet in one round trip
+      const res = await fetch(endpoints.bootstrap(['beds', 'ambulances']));
+      if (!res.ok) throw new Error(`Bootstrap failed: ${res.status}`);
+      const { beds: bedsData, ambulances: ambData } = await res.json();
       setBeds(bedsData);
       setAmbulances(ambData);
     } catch (e) {
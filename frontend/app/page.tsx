@@ -37,8 +37,8 @@ export default function DashboardPage() {
 
   const fetchData = useCallback(async () => {
     try {
-      const res = await fetch(endpoints.dashboardStats);
-      const json = await res.json();
+      const res = await fetch(endpoints.bootstrap(['stats']));
+      const json = (await res.json()).stats;
       const surgeRes = await fetch(endpoints.timeToCapacity);
       const surgeData = await surgeRes.json();
       setSurge(surgeData);
@@ -21,13 +21,10 @@ const StaffPortal = () => {
 
   const fetchStaffData = async () => {
     try {
-      const [staffRes, bedRes] = await Promise.all([
-        fetch(endpoints.staff),
-        fetch(endpoints.beds)
-      ]);
-      if (staffRes.ok && bedRes.ok) {
-        const staffData = await staffRes.json();
-        const bedData = await bedRes.json();
+      // Roster and beds in one round trip
+      const res = await fetch(endpoints.bootstrap(['staff', 'beds']));
+      if (res.ok) {
+        const { staff: staffData, beds: bedData } = await res.json();
         
         setStaffList(staffData.staff || []);
         setStats(staffData.stats || { nurses_on_shift: 0, doctors_on_shift: 0 });
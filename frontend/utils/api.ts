@@ -22,6 +22,9 @@ export const endpoints = {
 
   // Dashboard / Analytics
   dashboardStats: 'http://127.0.0.1:8000/api/dashboard/stats',
+  // Any subset of beds/stats/ambulances/staff/predictions/alerts in one request
+  bootstrap: (views?: string[], fields?: string[]) =>
+    `${API_BASE_URL}/api/bootstrap?views=${(views || []).join(',')}&fields=${(fields || []).join(',')}`,
   insights: `${API_BASE_URL}/api/dashboard/insights`,
   predictions: `${API_BASE_URL}/api/predictions`,
   predictInflow: 'http://127.0.0.1:8000/api/predict-inflow',